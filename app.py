@@ -3,121 +3,554 @@
 Cloud-Powered Notes Sharing System with SQLite and Real File Storage
 Install required packages first:
 !pip install gradio pandas pillow
+(optional: apsw, enabled with CLOUDNOTES_APSW=1)
 """
 
 import gradio as gr
 import pandas as pd
 import sqlite3
+import errno
 import hashlib
 import os
+import queue
+import re
 import shutil
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import count
+from html import escape
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import json
 
+try:
+    import apsw  # Optional: thinner SQLite binding for the search read path
+except ImportError:
+    apsw = None
+
 # ============================================================================
 # DATABASE SETUP AND MANAGEMENT
 # ============================================================================
 
+# Per-connection settings, applied to every pooled connection when it is opened
+# (journal_mode is persistent in the database file and set once in _init_database)
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA wal_autocheckpoint=1000",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+# Serve searches through apsw when it is installed and CLOUDNOTES_APSW=1.
+# Off by default: apsw ships its own SQLite library, and two SQLite copies
+# in one process don't share file locks. Pooled connections stay open for
+# the life of the process, which avoids the lock-dropping close() case.
+USE_APSW = apsw is not None and os.environ.get("CLOUDNOTES_APSW") == "1"
+
+# Seconds before the category list is re-read, so notes added by other
+# processes eventually show up
+CATEGORIES_CACHE_TTL = 60
+
+# Seconds between PRAGMA optimize runs, so planner statistics follow the tables
+# as they grow; it only re-analyzes a table once its size has changed a lot
+OPTIMIZE_INTERVAL = 3600
+
+# Stored in PRAGMA user_version once the one-off upgrades in _init_database have run
+SCHEMA_VERSION = 1
+
+
+# A search result row, as shown on a note card
+Note = namedtuple('Note', 'id title category subject description uploader_name upload_date '
+                          'downloads tags file_path file_name file_size avg_rating')
+
+# The logged-in user of the request being handled. The UI keeps the user in
+# per-session state and sets it at the start of every event, so concurrent
+# sessions never see each other's user.
+_current_user: ContextVar[Optional[Dict]] = ContextVar('current_user', default=None)
+
+class _ConnectionPool:
+    """Persistent SQLite connections: one writer and a few readers"""
+
+    def __init__(self, db_path: str, readers: int = 4, use_apsw: bool = False):
+        self.db_path = db_path
+        self._writer = queue.Queue(maxsize=1)
+        self._readers = queue.Queue(maxsize=readers)
+        self._apsw_readers = queue.Queue(maxsize=readers) if use_apsw else None
+
+        self._writer.put(self._connect())
+        for _ in range(readers):
+            self._readers.put(self._connect())
+            if use_apsw:
+                self._apsw_readers.put(self._connect_apsw())
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection in autocommit mode (transactions are explicit)"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               isolation_level=None, cached_statements=512)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _connect_apsw(self) -> "apsw.Connection":
+        """Open an apsw connection with the same per-connection settings"""
+        conn = apsw.Connection(self.db_path)
+        cursor = conn.cursor()
+        for pragma in CONNECTION_PRAGMAS:
+            cursor.execute(pragma).fetchall()
+        return conn
+
+    def optimize(self, statements):
+        """Run PRAGMA optimize for the tables the given statements read"""
+        # PRAGMA optimize only considers tables read by statements prepared on its
+        # own connection since it last ran, and pooled connections reuse cached
+        # statements, so prepare them afresh on a connection of its own
+        conn = self._connect()
+        try:
+            for sql in statements:
+                conn.execute("EXPLAIN " + sql, [None] * sql.count("?"))
+            # Sample large tables instead of reading every row
+            conn.execute("PRAGMA analysis_limit=1000")
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+
+        # The pooled connections keep the statistics they loaded at open until told
+        # to re-read them; their cached statements are then planned again
+        for pool in (self._writer, self._readers, self._apsw_readers):
+            if pool is None:
+                continue
+            conns = [pool.get() for _ in range(pool.maxsize)]
+            try:
+                for conn in conns:
+                    conn.cursor().execute("ANALYZE sqlite_schema")
+            finally:
+                for conn in conns:
+                    pool.put(conn)
+
+    def fetch_rows(self, sql: str, params) -> List[tuple]:
+        """Run a read-only query and return its rows as plain tuples"""
+        if self._apsw_readers is not None:
+            conn = self._apsw_readers.get()
+            try:
+                return conn.cursor().execute(sql, params).fetchall()
+            finally:
+                self._apsw_readers.put(conn)
+
+        with self.acquire() as conn:
+            # Plain tuples instead of sqlite3.Row
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            return cursor.execute(sql, params).fetchall()
+
+    @contextmanager
+    def acquire(self, write: bool = False):
+        """Check out a connection; writes run inside a single transaction"""
+        pool = self._writer if write else self._readers
+        conn = pool.get()
+        try:
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if write:
+                conn.execute("COMMIT")
+        finally:
+            # Never hand a connection back with a transaction (and its locks) still open
+            if conn.in_transaction:
+                conn.rollback()
+            pool.put(conn)
+
+def _sha256(password: bytes) -> str:
+    """Hash an encoded password using SHA-256"""
+    return hashlib.sha256(password).hexdigest()
+
+def _json_tags(tags: str) -> Optional[List[str]]:
+    """Decode tags stored as a JSON list by older versions, or None for plain text"""
+    try:
+        tag_names = json.loads(tags)
+    except ValueError:
+        return None  # Plain text that happens to start with '['
+    # Older versions only ever wrote lists of strings; anything else is text
+    if isinstance(tag_names, list) and all(isinstance(tag, str) for tag in tag_names):
+        return tag_names
+    return None
+
+def _split_joined_tags(joined: str, tags: set) -> Optional[List[str]]:
+    """Split space-joined tags back into the given tags, in their joined order
+
+    Tags may contain spaces and repeat, so a word can start several tags;
+    the split tries longer tags first and backtracks. Returns None if the
+    string isn't made of exactly these tags.
+    """
+    def split(start: int, seen: List[str]) -> Optional[List[str]]:
+        if start > len(joined):
+            return seen if len(seen) == len(tags) else None
+        for tag in sorted(tags, key=len, reverse=True):
+            end = start + len(tag)
+            if joined.startswith(tag, start) and (end == len(joined) or joined[end] == " "):
+                found = split(end + 1, seen if tag in seen else seen + [tag])
+                if found is not None:
+                    return found
+        return None
+    return split(0, []) if tags else None
+
+def _fts_phrase(query: str) -> str:
+    """Quote a search string as a single FTS5 phrase"""
+    return '"' + query.replace('"', '""') + '"'
+
+# search_notes picks one of these fixed statements so each query shape is
+# prepared once per connection and then served from the statement cache
+_SEARCH_SELECT = """
+    SELECT n.id, n.title, n.category, n.subject, n.description,
+           u.username as uploader_name, n.upload_date, n.downloads,
+           (SELECT GROUP_CONCAT(tag, ',') FROM (
+                SELECT tag FROM note_tags WHERE note_id = n.id ORDER BY position
+           )) as tag_list,
+           n.file_path, n.file_name, n.file_size,
+           {avg_rating} as avg_rating, {sort_key} as sort_key
+    FROM notes n
+    JOIN users u ON n.uploader_id = u.id
+"""
+
+_AVG_RATING = """CASE WHEN n.rating_count > 0
+                THEN CAST(n.rating_sum AS FLOAT) / n.rating_count
+                ELSE 0 END"""
+
+_SEARCH_MATCH = {
+    None: " WHERE 1=1",
+    "fts": """
+    JOIN notes_fts ON notes_fts.rowid = n.id
+    WHERE notes_fts MATCH ?""",
+    "like": """ WHERE (
+        n.title LIKE ? OR
+        n.description LIKE ? OR
+        n.subject LIKE ? OR
+        EXISTS (SELECT 1 FROM note_tags WHERE note_id = n.id AND tag LIKE ?)
+    )""",
+}
+
+# Each ordering's sort key, the condition that resumes after a cursor holding
+# the (sort key, id) of the last note shown, and the ORDER BY itself, with
+# {key} standing for the sort key. Ties are broken by id so pages don't overlap
+_SEARCH_ORDER = {
+    "rank": ("rank", "(rank, -n.id) > (?, -?)", " ORDER BY rank, n.id DESC"),
+    "recent": ("n.upload_date", "({key}, n.id) < (?, ?)", " ORDER BY {key} DESC, n.id DESC"),
+    "popular": ("n.downloads", "({key}, n.id) < (?, ?)", " ORDER BY {key} DESC, n.id DESC"),
+    "rating": (_AVG_RATING, "({key}, n.id) < (?, ?)", " ORDER BY {key} DESC, n.id DESC"),
+}
+
+def _search_statement(match: Optional[str], by_category: bool, order: str, keyset: bool) -> str:
+    """Build the search statement for one query shape"""
+    sort_key, keyset_sql, order_sql = _SEARCH_ORDER[order]
+    # A unary + hides a notes column from its indexes. With a full-text match
+    # that keeps MATCH driving the query, instead of walking a notes index and
+    # probing the match note by note. Statistics that lag behind the table favour
+    # that walk, and PRAGMA optimize lets them fall 25x behind before refreshing
+    hide = "+" if match == "fts" else ""
+    key = hide + sort_key
+    return (_SEARCH_SELECT.format(avg_rating=_AVG_RATING, sort_key=sort_key)
+            + _SEARCH_MATCH[match]
+            + (f" AND {hide}n.category = ?" if by_category else "")
+            + (" AND " + keyset_sql.format(key=key) if keyset else "")
+            + order_sql.format(key=key) + " LIMIT ? OFFSET ?")
+
+# Keyed by (match, filter by category, order, resume after a cursor). Relevance
+# rank only exists with a full-text match, so no other statement orders by it
+_SEARCH_SQL = {
+    (match, by_category, order, keyset): _search_statement(match, by_category, order, keyset)
+    for match in _SEARCH_MATCH
+    for by_category in (False, True)
+    for order in _SEARCH_ORDER
+    for keyset in (False, True)
+    if order != "rank" or match == "fts"
+}
+
 class NotesDatabase:
     """SQLite database manager for notes and users"""
 
     def __init__(self, db_path="notes_system.db", storage_dir="uploaded_files"):
         self.db_path = db_path
         self.storage_dir = storage_dir
-        self.current_user = None
+        self._categories_cache: Optional[List[str]] = None
+        self._categories_cached_at = 0.0
+        self._optimized_at = 0.0
 
         # Create storage directory if it doesn't exist
         os.makedirs(self.storage_dir, exist_ok=True)
 
         # Initialize database
+        self._pool = _ConnectionPool(self.db_path, use_apsw=USE_APSW)
         self._init_database()
+        self._check_search_sql()
         self._create_demo_data()
+        self._optimize()
 
-    def _get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    @property
+    def current_user(self) -> Optional[Dict]:
+        """User logged in for the current request"""
+        return _current_user.get()
+
+    @current_user.setter
+    def current_user(self, user: Optional[Dict]):
+        _current_user.set(user)
 
     def _init_database(self):
         """Initialize database tables"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        # WAL lets searches keep reading while uploads/ratings are written
+        with self._pool.acquire() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
 
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                email TEXT NOT NULL,
-                role TEXT DEFAULT 'student',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        with self._pool.acquire(write=True) as conn:
+            cursor = conn.cursor()
 
-        # Notes table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                category TEXT NOT NULL,
-                subject TEXT NOT NULL,
-                description TEXT,
-                uploader_id INTEGER NOT NULL,
-                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                downloads INTEGER DEFAULT 0,
-                tags TEXT,
-                file_path TEXT NOT NULL,
-                file_name TEXT NOT NULL,
-                file_size INTEGER,
-                rating_sum INTEGER DEFAULT 0,
-                rating_count INTEGER DEFAULT 0,
-                FOREIGN KEY (uploader_id) REFERENCES users(id)
-            )
-        """)
+            # Tables created before note deletes cascaded are rebuilt below
+            legacy_tables = self._detach_legacy_child_tables(cursor)
+            # Tags stored before note_tags kept the order they were entered in
+            cursor.execute("PRAGMA table_info({})".format(
+                "note_tags_legacy" if "note_tags" in legacy_tables else "note_tags"))
+            tag_columns = [col['name'] for col in cursor.fetchall()]
+            tags_unordered = bool(tag_columns) and 'position' not in tag_columns
 
-        # Downloads table (track who downloaded what)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS download_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                note_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                download_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (note_id) REFERENCES notes(id),
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
+            # Users table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    role TEXT DEFAULT 'student',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
 
-        # Ratings table
+            # Notes table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS notes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    description TEXT,
+                    uploader_id INTEGER NOT NULL,
+                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    downloads INTEGER DEFAULT 0,
+                    tags TEXT,
+                    file_path TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    file_size INTEGER,
+                    rating_sum INTEGER DEFAULT 0,
+                    rating_count INTEGER DEFAULT 0,
+                    FOREIGN KEY (uploader_id) REFERENCES users(id)
+                )
+            """)
+
+            # Downloads table (track who downloaded what)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS download_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    note_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    download_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            """)
+
+            # Ratings table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ratings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    note_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
+                    review TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(note_id, user_id),
+                    FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            """)
+
+            # Tags table (one row per note tag, for indexed tag lookups)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS note_tags (
+                    note_id INTEGER NOT NULL,
+                    tag TEXT NOT NULL,
+                    position INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (note_id, tag),
+                    FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE
+                )
+            """)
+            # Such tables are numbered once their rows are back, below
+            cursor.execute("PRAGMA table_info(note_tags)")
+            if not any(col['name'] == 'position' for col in cursor.fetchall()):
+                cursor.execute("ALTER TABLE note_tags ADD COLUMN position INTEGER NOT NULL DEFAULT 0")
+
+            for table in legacy_tables:
+                self._restore_legacy_child_table(cursor, table)
+            # Only rows copied from such a table, before any are written with positions
+            if tags_unordered:
+                self._number_tag_positions(cursor)
+
+            # Indexes matching the search filters/orderings and per-note lookups
+            # (users.username and ratings.note_id are already covered by UNIQUE constraints)
+            # The sort indexes are ascending: every index ends in the rowid, so scanning
+            # one backwards yields "<key> DESC, n.id DESC" without a temp B-tree
+            cursor.execute("DROP INDEX IF EXISTS idx_notes_category_date")
+            cursor.execute("DROP INDEX IF EXISTS idx_notes_downloads")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_recent ON notes(upload_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_category_recent ON notes(category, upload_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_popular ON notes(downloads)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_category_popular ON notes(category, downloads)")
+            # Must stay the same expression as _AVG_RATING (n. prefix aside) to be used
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_notes_rating ON notes((
+                    CASE WHEN rating_count > 0
+                         THEN CAST(rating_sum AS FLOAT) / rating_count
+                         ELSE 0 END))
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_notes_category_rating ON notes(category, (
+                    CASE WHEN rating_count > 0
+                         THEN CAST(rating_sum AS FLOAT) / rating_count
+                         ELSE 0 END))
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_uploader ON notes(uploader_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_dh_user ON download_history(user_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_dh_note ON download_history(note_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags(tag)")
+
+            # Full-text index over the searchable note columns, including the
+            # space-joined tags. The trigram tokenizer matches arbitrary
+            # substrings, like the old LIKE '%q%'.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'")
+            fts_exists = cursor.fetchone() is not None
+
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                    title, description, subject, tags,
+                    content='notes', content_rowid='id', tokenize='trigram'
+                )
+            """)
+
+            # Keep the index in sync with notes
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+                    INSERT INTO notes_fts (rowid, title, description, subject, tags)
+                    VALUES (new.id, new.title, new.description, new.subject, new.tags);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+                    INSERT INTO notes_fts (notes_fts, rowid, title, description, subject, tags)
+                    VALUES ('delete', old.id, old.title, old.description, old.subject, old.tags);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS notes_fts_update
+                AFTER UPDATE OF title, description, subject, tags ON notes BEGIN
+                    INSERT INTO notes_fts (notes_fts, rowid, title, description, subject, tags)
+                    VALUES ('delete', old.id, old.title, old.description, old.subject, old.tags);
+                    INSERT INTO notes_fts (rowid, title, description, subject, tags)
+                    VALUES (new.id, new.title, new.description, new.subject, new.tags);
+                END
+            """)
+
+            # Index notes that existed before the full-text table was added
+            if not fts_exists:
+                cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+            # One-off upgrades, tracked in the database header
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                # Convert tags stored as JSON by older versions (after the full-text
+                # index is built, so the update trigger reindexes them)
+                self._migrate_json_tags(cursor)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _detach_legacy_child_tables(self, cursor) -> List[str]:
+        """Rename note child tables whose foreign key doesn't cascade deletes"""
+        legacy = []
+        for table in ("download_history", "ratings", "note_tags"):
+            cursor.execute(f"PRAGMA foreign_key_list({table})")
+            if any(fk['table'] == 'notes' and fk['on_delete'] != 'CASCADE' for fk in cursor.fetchall()):
+                cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+                legacy.append(table)
+        return legacy
+
+    def _restore_legacy_child_table(self, cursor, table: str):
+        """Copy rows from a renamed child table into its new definition"""
+        # Skip rows whose parent is already gone, they would fail the foreign keys
+        cursor.execute(f"PRAGMA foreign_key_list({table})")
+        parent_exists = " AND ".join(
+            f"{fk['from']} IN (SELECT {fk['to']} FROM {fk['table']})" for fk in cursor.fetchall()
+        )
+        # Name the columns, the new definition may have gained some since
+        cursor.execute(f"PRAGMA table_info({table}_legacy)")
+        columns = ", ".join(col['name'] for col in cursor.fetchall())
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {table} ({columns})
+            SELECT {columns} FROM {table}_legacy WHERE {parent_exists}
+        """)
+        cursor.execute(f"DROP TABLE {table}_legacy")
+
+    def _migrate_json_tags(self, cursor):
+        """Move JSON-encoded tags into note_tags and store them space-joined"""
+        cursor.execute("SELECT id, tags FROM notes WHERE tags LIKE '[%'")
+        notes = []
+        for note_id, tags in cursor.fetchall():
+            tag_names = _json_tags(tags)
+            if tag_names is not None:
+                notes.append((note_id, tag_names))
+
+        cursor.executemany("INSERT OR IGNORE INTO note_tags (note_id, tag, position) VALUES (?, ?, ?)",
+                           [(note_id, tag, position) for note_id, tag_names in notes
+                            for position, tag in enumerate(tag_names)])
+        cursor.executemany("UPDATE notes SET tags = ? WHERE id = ?",
+                           [(" ".join(tag_names), note_id) for note_id, tag_names in notes])
+
+    def _number_tag_positions(self, cursor):
+        """Recover the entered order of tags stored before note_tags kept it"""
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS ratings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                note_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
-                review TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(note_id, user_id),
-                FOREIGN KEY (note_id) REFERENCES notes(id),
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
+            SELECT n.id, n.tags, GROUP_CONCAT(t.tag, char(31))
+            FROM notes n JOIN note_tags t ON t.note_id = n.id
+            GROUP BY n.id
         """)
-
-        conn.commit()
-        conn.close()
+        positions = []
+        for note_id, stored, tag_list in cursor.fetchall():
+            tags = set(tag_list.split("\x1f"))
+            # notes.tags still holds them in entered order: as JSON, or space-joined
+            json_names = _json_tags(stored) if stored and stored.startswith("[") else None
+            if json_names is not None:
+                tag_names = list(dict.fromkeys(json_names)) if set(json_names) == tags else None
+            else:
+                tag_names = _split_joined_tags(stored or "", tags)
+            # Left at 0 when notes.tags no longer spells out exactly these tags
+            if tag_names is not None:
+                positions.extend((position, note_id, tag) for position, tag in enumerate(tag_names))
+        cursor.executemany("UPDATE note_tags SET position = ? WHERE note_id = ? AND tag = ?",
+                           positions)
+
+    def _check_search_sql(self):
+        """Compile every precomposed search statement, so a broken one fails at startup"""
+        with self._pool.acquire() as conn:
+            for sql in _SEARCH_SQL.values():
+                conn.execute("EXPLAIN " + sql, [None] * sql.count("?"))
 
     def _create_demo_data(self):
         """Create demo users and sample notes"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        # Check if demo data already exists
-        cursor.execute("SELECT COUNT(*) FROM users")
-        if cursor.fetchone()[0] > 0:
-            conn.close()
-            return
+        # Seed only a database without any users; asking the database itself
+        # keeps this right when it is recreated next to an existing uploads dir
+        with self._pool.acquire() as conn:
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM users)").fetchone()[0]:
+                return
 
         # Create demo users
         demo_users = [
@@ -126,12 +559,6 @@ class NotesDatabase:
             ("professor", "prof123", "professor@university.edu", "teacher")
         ]
 
-        for username, password, email, role in demo_users:
-            cursor.execute("""
-                INSERT INTO users (username, password, email, role)
-                VALUES (?, ?, ?, ?)
-            """, (username, self._hash_password(password), email, role))
-
         # Create sample notes with dummy files
         sample_notes = [
             {
@@ -140,7 +567,7 @@ class NotesDatabase:
                 "subject": "Programming",
                 "description": "Comprehensive guide covering Python basics, data structures, OOP, and best practices for beginners",
                 "uploader_id": 1,
-                "tags": json.dumps(["python", "programming", "basics", "oop"]),
+                "tags": ["python", "programming", "basics", "oop"],
                 "file_name": "intro_python.pdf"
             },
             {
@@ -149,7 +576,7 @@ class NotesDatabase:
                 "subject": "Calculus",
                 "description": "Complete notes on differential and integral calculus with solved examples and practice problems",
                 "uploader_id": 2,
-                "tags": json.dumps(["calculus", "derivatives", "integrals", "mathematics"]),
+                "tags": ["calculus", "derivatives", "integrals", "mathematics"],
                 "file_name": "calculus_notes.pdf"
             },
             {
@@ -158,7 +585,7 @@ class NotesDatabase:
                 "subject": "Databases",
                 "description": "SQL, normalization, transactions, indexing, and database design patterns",
                 "uploader_id": 1,
-                "tags": json.dumps(["database", "sql", "dbms", "normalization"]),
+                "tags": ["database", "sql", "dbms", "normalization"],
                 "file_name": "dbms_notes.pdf"
             },
             {
@@ -167,7 +594,7 @@ class NotesDatabase:
                 "subject": "Organic Chemistry",
                 "description": "Common organic reactions, mechanisms, and synthesis strategies",
                 "uploader_id": 3,
-                "tags": json.dumps(["chemistry", "organic", "reactions", "mechanisms"]),
+                "tags": ["chemistry", "organic", "reactions", "mechanisms"],
                 "file_name": "organic_chem.pdf"
             },
             {
@@ -176,11 +603,15 @@ class NotesDatabase:
                 "subject": "DSA",
                 "description": "Arrays, linked lists, trees, graphs, sorting, searching, and dynamic programming",
                 "uploader_id": 2,
-                "tags": json.dumps(["dsa", "algorithms", "data-structures", "programming"]),
+                "tags": ["dsa", "algorithms", "data-structures", "programming"],
                 "file_name": "dsa_notes.pdf"
             }
         ]
 
+        user_rows = [(username, _sha256(password.encode()), email, role)
+                     for username, password, email, role in demo_users]
+
+        note_rows = []
         for note in sample_notes:
             # Create dummy file
             file_path = os.path.join(self.storage_dir, note["file_name"])
@@ -190,36 +621,52 @@ class NotesDatabase:
 
             file_size = os.path.getsize(file_path)
 
-            cursor.execute("""
+            note_rows.append((note["title"], note["category"], note["subject"], note["description"],
+                              note["uploader_id"], " ".join(note["tags"]), file_path,
+                              note["file_name"], file_size))
+
+        # Seed everything in one transaction
+        with self._pool.acquire(write=True) as conn:
+            conn.executemany("""
+                INSERT INTO users (username, password, email, role)
+                VALUES (?, ?, ?, ?)
+            """, user_rows)
+
+            conn.executemany("""
                 INSERT INTO notes (title, category, subject, description, uploader_id,
                                  tags, file_path, file_name, file_size)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (note["title"], note["category"], note["subject"], note["description"],
-                  note["uploader_id"], note["tags"], file_path, note["file_name"], file_size))
+            """, note_rows)
+
+            # The notes table was empty, so ids follow insertion order
+            note_ids = [row[0] for row in conn.execute("SELECT id FROM notes ORDER BY id")]
+            conn.executemany("INSERT INTO note_tags (note_id, tag, position) VALUES (?, ?, ?)",
+                             [(note_id, tag, position) for note_id, note in zip(note_ids, sample_notes)
+                              for position, tag in enumerate(note["tags"])])
 
-        conn.commit()
-        conn.close()
+    def _optimize(self):
+        """Refresh planner statistics of the tables that changed a lot since last analyzed"""
+        self._pool.optimize(_SEARCH_SQL.values())
+        self._optimized_at = time.monotonic()
 
-    def _hash_password(self, password: str) -> str:
-        """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+    def _optimize_if_due(self):
+        """Run _optimize when OPTIMIZE_INTERVAL has passed since the last run"""
+        if time.monotonic() - self._optimized_at > OPTIMIZE_INTERVAL:
+            self._optimize()
 
     def authenticate(self, username: str, password: str) -> Tuple[bool, str, Optional[int]]:
         """Authenticate user"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT id, username, password, role FROM users WHERE username = ?
-        """, (username,))
-
-        user = cursor.fetchone()
-        conn.close()
-
-        if user and user['password'] == self._hash_password(password):
+        # Compare the hash in SQL so only a matching row is returned
+        password_hash = _sha256(password.encode())
+        with self._pool.acquire() as conn:
+            user = conn.execute("""
+                SELECT id, role FROM users WHERE username = ? AND password = ?
+            """, (username, password_hash)).fetchone()
+
+        if user:
             self.current_user = {
                 'id': user['id'],
-                'username': user['username'],
+                'username': username,
                 'role': user['role']
             }
             return True, f"Welcome back, {username}!", user['id']
@@ -233,153 +680,189 @@ class NotesDatabase:
         if len(password) < 6:
             return False, "Password must be at least 6 characters"
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute("""
-                INSERT INTO users (username, password, email, role)
-                VALUES (?, ?, ?, 'student')
-            """, (username, self._hash_password(password), email))
-            conn.commit()
-            conn.close()
+            with self._pool.acquire(write=True) as conn:
+                conn.execute("""
+                    INSERT INTO users (username, password, email, role)
+                    VALUES (?, ?, ?, 'student')
+                """, (username, _sha256(password.encode()), email))
             return True, "Registration successful! Please login."
         except sqlite3.IntegrityError:
-            conn.close()
             return False, "Username already exists"
 
     def add_note(self, title: str, category: str, subject: str,
                  description: str, tags: str, file) -> Tuple[bool, str]:
         """Add new note with file"""
+        return self._add_note(title, category, subject, description, tags, file)[:2]
+
+    def add_note_returning_categories(self, title: str, category: str, subject: str,
+                                      description: str, tags: str,
+                                      file) -> Tuple[bool, str, Optional[List[str]]]:
+        """Add new note and return the category list, read in the same transaction"""
+        success, message, categories = self._add_note(
+            title, category, subject, description, tags, file, with_categories=True)
+        return success, message, ["All"] + categories if success else None
+
+    def _add_note(self, title: str, category: str, subject: str, description: str,
+                  tags: str, file, with_categories: bool = False):
+        """Store the file and insert the note, optionally reading categories back"""
         if not self.current_user:
-            return False, "Please login first"
+            return False, "Please login first", None
 
         if not file:
-            return False, "Please upload a file"
+            return False, "Please upload a file", None
 
         if not title or not category or not subject:
-            return False, "Please fill all required fields"
+            return False, "Please fill all required fields", None
+
+        # Uploads are what grow the tables, so they keep the statistics current
+        self._optimize_if_due()
 
         # Save file
         file_name = os.path.basename(file.name)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_file_name = f"{timestamp}_{file_name}"
+        # The timestamp alone repeats for uploads within the same second
+        unique_file_name = f"{timestamp}_{uuid.uuid4().hex[:12]}_{file_name}"
         file_path = os.path.join(self.storage_dir, unique_file_name)
+        stored = False
 
         try:
-            shutil.copy(file.name, file_path)
-            file_size = os.path.getsize(file_path)
-
-            # Insert into database
-            conn = self._get_connection()
-            cursor = conn.cursor()
-
-            tags_list = json.dumps([tag.strip() for tag in tags.split(",") if tag.strip()])
+            file_size = os.stat(file.name).st_size
 
-            cursor.execute("""
-                INSERT INTO notes (title, category, subject, description, uploader_id,
-                                 tags, file_path, file_name, file_size)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (title, category, subject, description, self.current_user['id'],
-                  tags_list, file_path, file_name, file_size))
+            # A hard link costs nothing when the upload is on the same filesystem;
+            # otherwise copyfile streams it in the kernel (sendfile) where available
+            try:
+                os.link(file.name, file_path)
+            except OSError as e:
+                # Never copy over an existing file: it belongs to another note
+                if e.errno not in (errno.EXDEV, errno.EPERM):
+                    raise
+                shutil.copyfile(file.name, file_path)
+            stored = True
 
-            conn.commit()
-            conn.close()
+            tag_names = [tag.strip() for tag in tags.split(",") if tag.strip()]
 
-            return True, f"✅ '{title}' uploaded successfully!"
+            # Insert into database
+            with self._pool.acquire(write=True) as conn:
+                cursor = conn.cursor()
+
+                cursor.execute("""
+                    INSERT INTO notes (title, category, subject, description, uploader_id,
+                                     tags, file_path, file_name, file_size)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (title, category, subject, description, self.current_user['id'],
+                      " ".join(tag_names), file_path, file_name, file_size))
+
+                note_id = cursor.lastrowid
+                cursor.executemany("""
+                    INSERT OR IGNORE INTO note_tags (note_id, tag, position) VALUES (?, ?, ?)
+                """, [(note_id, tag, position) for position, tag in enumerate(tag_names)])
+
+                categories = self._categories_cache
+                fresh = with_categories and (
+                    categories is None or category not in categories
+                    or time.monotonic() - self._categories_cached_at > CATEGORIES_CACHE_TTL)
+                if fresh:
+                    # Still on the writer, so the new row is visible without another round-trip
+                    categories = [row[0] for row in cursor.execute(
+                        "SELECT DISTINCT category FROM notes ORDER BY category")]
+
+            if fresh:
+                self._categories_cache = categories
+                self._categories_cached_at = time.monotonic()
+            elif categories is not None and category not in categories:
+                # Only a category that isn't listed yet changes the cached list
+                self._categories_cache = None
+
+            return True, f"✅ '{title}' uploaded successfully!", categories
 
         except Exception as e:
-            return False, f"Error uploading file: {str(e)}"
+            # Don't leave an orphaned file behind when the insert fails
+            if stored:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            return False, f"Error uploading file: {str(e)}", None
 
     def search_notes(self, query: str = "", category: str = "All",
-                    sort_by: str = "recent") -> List[Dict]:
-        """Search notes with filters"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        sql = """
-            SELECT n.*, u.username as uploader_name,
-                   CASE WHEN n.rating_count > 0
-                        THEN CAST(n.rating_sum AS FLOAT) / n.rating_count
-                        ELSE 0 END as avg_rating
-            FROM notes n
-            JOIN users u ON n.uploader_id = u.id
-            WHERE 1=1
+                    sort_by: str = "recent", limit: int = 20, offset: int = 0,
+                    before: Optional[Tuple] = None) -> List[Note]:
+        """Search notes with filters, one page at a time"""
+        return self.search_page(query, category, sort_by, limit, offset, before)[0]
+
+    def search_page(self, query: str = "", category: str = "All",
+                    sort_by: str = "recent", limit: int = 20, offset: int = 0,
+                    before: Optional[Tuple] = None) -> Tuple[List[Note], Optional[Tuple], bool]:
+        """Search notes with filters, returning one page, a cursor past it and
+        whether more notes follow
+
+        Passing the cursor back as `before` continues right after the last note
+        of the page, so notes added or removed meanwhile don't shift the next
+        page the way OFFSET would. The cursor is None for an empty page.
         """
-        params = []
-
-        if query:
-            sql += """ AND (
-                n.title LIKE ? OR
-                n.description LIKE ? OR
-                n.subject LIKE ? OR
-                n.tags LIKE ?
-            )"""
-            search_term = f"%{query}%"
-            params.extend([search_term] * 4)
+        # The trigram index needs at least three characters to match on
+        if len(query) >= 3:
+            match, params = "fts", [_fts_phrase(query)]
+        elif query:
+            match, params = "like", [f"%{query}%"] * 4
+        else:
+            match, params = None, []
 
         if category != "All":
-            sql += " AND n.category = ?"
             params.append(category)
 
-        # Sorting
-        if sort_by == "recent":
-            sql += " ORDER BY n.upload_date DESC"
-        elif sort_by == "popular":
-            sql += " ORDER BY n.downloads DESC"
-        elif sort_by == "rating":
-            sql += " ORDER BY avg_rating DESC"
-
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        conn.close()
-
-        results = []
-        for row in rows:
-            results.append({
-                'id': row['id'],
-                'title': row['title'],
-                'category': row['category'],
-                'subject': row['subject'],
-                'description': row['description'],
-                'uploader_name': row['uploader_name'],
-                'upload_date': row['upload_date'],
-                'downloads': row['downloads'],
-                'tags': json.loads(row['tags']),
-                'file_path': row['file_path'],
-                'file_name': row['file_name'],
-                'file_size': row['file_size'],
-                'avg_rating': round(row['avg_rating'], 1)
-            })
-
-        return results
+        # Without a full-text match there is no rank, so relevance falls back to recent
+        if sort_by in ("relevance", "rank"):
+            order = "rank" if match == "fts" else "recent"
+        else:
+            order = sort_by if sort_by in _SEARCH_ORDER else "recent"
+
+        keyset = bool(before)
+        if keyset:
+            params.extend(before)
+
+        # One row past the page tells whether another page follows
+        params.extend([limit + 1, offset])
+        sql = _SEARCH_SQL[match, category != "All", order, keyset]
+
+        # Rows come back as plain tuples and are unpacked by position
+        rows = self._pool.fetch_rows(sql, params)
+        more = len(rows) > limit
+        del rows[limit:]
+
+        notes = [Note(note_id, title, category, subject, description, uploader_name,
+                      upload_date, downloads, tag_list.split(',') if tag_list else [],
+                      file_path, file_name, file_size, round(avg_rating, 1))
+                 for (note_id, title, category, subject, description, uploader_name, upload_date,
+                      downloads, tag_list, file_path, file_name, file_size, avg_rating, _) in rows]
+        # The raw sort key, not the rounded rating shown on the card
+        cursor = (rows[-1][-1], rows[-1][0]) if rows else None
+        return notes, cursor, more
 
     def download_note(self, note_id: int) -> Tuple[bool, str, Optional[str]]:
         """Download note and track download"""
         if not self.current_user:
             return False, "Please login first", None
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-        note = cursor.fetchone()
-
-        if not note:
-            conn.close()
-            return False, "Note not found", None
+        with self._pool.acquire(write=True) as conn:
+            cursor = conn.cursor()
 
-        # Update download count
-        cursor.execute("UPDATE notes SET downloads = downloads + 1 WHERE id = ?", (note_id,))
+            # Update download count, fetching only what the caller needs
+            cursor.execute("""
+                UPDATE notes SET downloads = downloads + 1 WHERE id = ?
+                RETURNING title, file_path
+            """, (note_id,))
+            note = cursor.fetchone()
 
-        # Track download history
-        cursor.execute("""
-            INSERT INTO download_history (note_id, user_id)
-            VALUES (?, ?)
-        """, (note_id, self.current_user['id']))
+            if not note:
+                return False, "Note not found", None
 
-        conn.commit()
-        conn.close()
+            # Track download history
+            cursor.execute("""
+                INSERT INTO download_history (note_id, user_id)
+                VALUES (?, ?)
+            """, (note_id, self.current_user['id']))
 
         return True, f"✅ '{note['title']}' ready for download", note['file_path']
 
@@ -391,32 +874,34 @@ class NotesDatabase:
         if rating < 1 or rating > 5:
             return False, "Rating must be between 1 and 5"
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
         try:
-            # Insert or update rating
-            cursor.execute("""
-                INSERT INTO ratings (note_id, user_id, rating, review)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(note_id, user_id)
-                DO UPDATE SET rating = ?, review = ?
-            """, (note_id, self.current_user['id'], rating, review, rating, review))
-
-            # Update note rating summary
-            cursor.execute("""
-                UPDATE notes
-                SET rating_sum = (SELECT SUM(rating) FROM ratings WHERE note_id = ?),
-                    rating_count = (SELECT COUNT(*) FROM ratings WHERE note_id = ?)
-                WHERE id = ?
-            """, (note_id, note_id, note_id))
+            with self._pool.acquire(write=True) as conn:
+                cursor = conn.cursor()
+
+                # Insert or update rating
+                cursor.execute("""
+                    INSERT INTO ratings (note_id, user_id, rating, review)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(note_id, user_id)
+                    DO UPDATE SET rating = ?, review = ?
+                """, (note_id, self.current_user['id'], rating, review, rating, review))
+
+                # Update note rating summary from a single pass over its ratings
+                cursor.execute("""
+                    SELECT COALESCE(SUM(rating), 0), COUNT(*) FROM ratings WHERE note_id = ?
+                """, (note_id,))
+                rating_sum, rating_count = cursor.fetchone()
+
+                cursor.execute("""
+                    UPDATE notes SET rating_sum = ?, rating_count = ? WHERE id = ?
+                """, (rating_sum, rating_count, note_id))
 
-            conn.commit()
-            conn.close()
             return True, "✅ Rating submitted successfully!"
 
+        except sqlite3.IntegrityError:
+            # The rating's foreign key rejects ids of notes that don't exist
+            return False, "Note not found"
         except Exception as e:
-            conn.close()
             return False, f"Error submitting rating: {str(e)}"
 
     def get_user_stats(self) -> Dict:
@@ -424,29 +909,27 @@ class NotesDatabase:
         if not self.current_user:
             return {}
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        # User info
-        cursor.execute("""
-            SELECT username, email, created_at FROM users WHERE id = ?
-        """, (self.current_user['id'],))
-        user = cursor.fetchone()
+        with self._pool.acquire() as conn:
+            cursor = conn.cursor()
 
-        # Upload stats
-        cursor.execute("""
-            SELECT COUNT(*) as count, COALESCE(SUM(downloads), 0) as total_downloads
-            FROM notes WHERE uploader_id = ?
-        """, (self.current_user['id'],))
-        upload_stats = cursor.fetchone()
+            # User info
+            cursor.execute("""
+                SELECT username, email, created_at FROM users WHERE id = ?
+            """, (self.current_user['id'],))
+            user = cursor.fetchone()
 
-        # Download stats
-        cursor.execute("""
-            SELECT COUNT(*) FROM download_history WHERE user_id = ?
-        """, (self.current_user['id'],))
-        download_count = cursor.fetchone()[0]
+            # Upload stats
+            cursor.execute("""
+                SELECT COUNT(*) as count, COALESCE(SUM(downloads), 0) as total_downloads
+                FROM notes WHERE uploader_id = ?
+            """, (self.current_user['id'],))
+            upload_stats = cursor.fetchone()
 
-        conn.close()
+            # Download stats
+            cursor.execute("""
+                SELECT COUNT(*) FROM download_history WHERE user_id = ?
+            """, (self.current_user['id'],))
+            download_count = cursor.fetchone()[0]
 
         return {
             'username': user['username'],
@@ -460,11 +943,13 @@ class NotesDatabase:
 
     def get_all_categories(self) -> List[str]:
         """Get all unique categories"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT category FROM notes ORDER BY category")
-        categories = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        categories = self._categories_cache
+        if categories is None or time.monotonic() - self._categories_cached_at > CATEGORIES_CACHE_TTL:
+            with self._pool.acquire() as conn:
+                rows = conn.execute("SELECT DISTINCT category FROM notes ORDER BY category").fetchall()
+            categories = [row[0] for row in rows]
+            self._categories_cache = categories
+            self._categories_cached_at = time.monotonic()
         return ["All"] + categories
 
     def delete_note(self, note_id: int) -> Tuple[bool, str]:
@@ -472,36 +957,28 @@ class NotesDatabase:
         if not self.current_user:
             return False, "Please login first"
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._pool.acquire(write=True) as conn:
+            # Permission check is part of the DELETE; ratings, downloads and
+            # tags of the note are removed by ON DELETE CASCADE
+            note = conn.execute("""
+                DELETE FROM notes WHERE id = ? AND (uploader_id = ? OR ? = 'admin')
+                RETURNING file_path
+            """, (note_id, self.current_user['id'], self.current_user['role'])).fetchone()
 
-        cursor.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-        note = cursor.fetchone()
+            if not note:
+                exists = conn.execute("SELECT 1 FROM notes WHERE id = ?", (note_id,)).fetchone()
+                if not exists:
+                    return False, "Note not found"
+                return False, "You don't have permission to delete this note"
 
-        if not note:
-            conn.close()
-            return False, "Note not found"
+        self._categories_cache = None
 
-        # Check permission
-        if note['uploader_id'] != self.current_user['id'] and self.current_user['role'] != 'admin':
-            conn.close()
-            return False, "You don't have permission to delete this note"
-
-        # Delete file
+        # Delete file once the row is gone
         try:
-            if os.path.exists(note['file_path']):
-                os.remove(note['file_path'])
-        except:
+            os.remove(note['file_path'])
+        except OSError:
             pass
 
-        # Delete from database
-        cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-        cursor.execute("DELETE FROM download_history WHERE note_id = ?", (note_id,))
-        cursor.execute("DELETE FROM ratings WHERE note_id = ?", (note_id,))
-
-        conn.commit()
-        conn.close()
-
         return True, "✅ Note deleted successfully"
 
 # Initialize database
@@ -511,35 +988,27 @@ db = NotesDatabase()
 # UI HELPER FUNCTIONS
 # ============================================================================
 
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
 def format_file_size(size_bytes: int) -> str:
     """Format file size to human readable format"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.1f} TB"
-
-def format_note_card(note: Dict) -> str:
-    """Format note as beautiful HTML card"""
-    tags_html = " ".join([
-        f'<span style="background:rgba(102,126,234,0.2);color:#667eea;padding:4px 12px;'
-        f'border-radius:20px;font-size:12px;margin-right:6px;font-weight:500;">{tag}</span>'
-        for tag in note['tags']
-    ])
+    # Each unit is 2**10 of the previous one, so the bit length picks it directly
+    unit = min((int(size_bytes).bit_length() - 1) // 10, 4) if size_bytes > 0 else 0
+    return f"{size_bytes / (1 << (unit * 10)):.1f} {_SIZE_UNITS[unit]}"
 
-    file_size = format_file_size(note['file_size'])
-    stars = "⭐" * int(note['avg_rating']) + "☆" * (5 - int(note['avg_rating']))
+_TAG_TMPL = ('<span style="background:rgba(102,126,234,0.2);color:#667eea;padding:4px 12px;'
+             'border-radius:20px;font-size:12px;margin-right:6px;font-weight:500;">{tag}</span>')
 
-    return f"""
+_CARD_TMPL = """
     <div style="background:white;border-radius:20px;padding:28px;margin:16px 0;
                 box-shadow:0 10px 30px rgba(0,0,0,0.08);border:1px solid #e8e8e8;
                 transition:all 0.3s ease;">
         <div style="display:flex;justify-content:space-between;align-items:start;margin-bottom:16px;">
             <div style="flex:1;">
                 <h3 style="margin:0 0 12px 0;font-size:24px;font-weight:700;color:#2d3748;
-                           line-height:1.3;">{note['title']}</h3>
+                           line-height:1.3;">{title}</h3>
                 <p style="margin:0 0 16px 0;color:#718096;font-size:15px;line-height:1.6;">
-                    {note['description']}</p>
+                    {description}</p>
                 <div style="margin-bottom:16px;">
                     {tags_html}
                 </div>
@@ -548,10 +1017,10 @@ def format_note_card(note: Dict) -> str:
                 <div style="background:linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                            color:white;padding:12px 20px;border-radius:12px;font-size:14px;
                            font-weight:600;margin-bottom:8px;">
-                    {note['category']}
+                    {category}
                 </div>
                 <div style="color:#667eea;font-size:28px;font-weight:700;">
-                    {note['avg_rating']}/5
+                    {avg_rating}/5
                 </div>
                 <div style="font-size:12px;color:#a0aec0;">
                     {stars}
@@ -564,19 +1033,19 @@ def format_note_card(note: Dict) -> str:
                        gap:16px;font-size:13px;color:#4a5568;">
                 <div>
                     <div style="color:#a0aec0;margin-bottom:4px;">📚 Subject</div>
-                    <div style="font-weight:600;">{note['subject']}</div>
+                    <div style="font-weight:600;">{subject}</div>
                 </div>
                 <div>
                     <div style="color:#a0aec0;margin-bottom:4px;">👤 Uploaded by</div>
-                    <div style="font-weight:600;">{note['uploader_name']}</div>
+                    <div style="font-weight:600;">{uploader_name}</div>
                 </div>
                 <div>
                     <div style="color:#a0aec0;margin-bottom:4px;">📅 Date</div>
-                    <div style="font-weight:600;">{note['upload_date'][:10]}</div>
+                    <div style="font-weight:600;">{upload_date}</div>
                 </div>
                 <div>
                     <div style="color:#a0aec0;margin-bottom:4px;">⬇️ Downloads</div>
-                    <div style="font-weight:600;">{note['downloads']}</div>
+                    <div style="font-weight:600;">{downloads}</div>
                 </div>
                 <div>
                     <div style="color:#a0aec0;margin-bottom:4px;">📄 File Size</div>
@@ -586,11 +1055,11 @@ def format_note_card(note: Dict) -> str:
         </div>
 
         <div style="display:flex;gap:12px;align-items:center;">
-            <button onclick="navigator.clipboard.writeText('{note['id']}')"
+            <button onclick="navigator.clipboard.writeText('{id}')"
                     style="background:#667eea;border:none;color:white;padding:12px 24px;
                            border-radius:10px;cursor:pointer;font-weight:600;font-size:14px;
                            transition:all 0.3s ease;">
-                📋 Copy ID: {note['id']}
+                📋 Copy ID: {id}
             </button>
             <div style="color:#a0aec0;font-size:13px;font-style:italic;">
                 Use this ID to download or rate the note
@@ -599,6 +1068,28 @@ def format_note_card(note: Dict) -> str:
     </div>
     """
 
+_STARS = tuple("⭐" * n + "☆" * (5 - n) for n in range(6))
+
+def format_note_card(note: Note) -> str:
+    """Format note as beautiful HTML card"""
+    # Only the user-supplied fields need escaping; the template itself is trusted markup
+    tags_html = " ".join(_TAG_TMPL.format(tag=escape(tag)) for tag in note.tags)
+
+    return _CARD_TMPL.format(
+        id=note.id,
+        title=escape(note.title),
+        description=escape(note.description),
+        tags_html=tags_html,
+        category=escape(note.category),
+        avg_rating=note.avg_rating,
+        stars=_STARS[int(note.avg_rating)],
+        subject=escape(note.subject),
+        uploader_name=escape(note.uploader_name),
+        upload_date=note.upload_date[:10],
+        downloads=note.downloads,
+        file_size=format_file_size(note.file_size)
+    )
+
 def create_stats_card(label: str, value: str, icon: str, color: str) -> str:
     """Create statistics card"""
     return f"""
@@ -627,7 +1118,9 @@ def login(username: str, password: str):
             gr.update(visible=True),
             gr.update(choices=categories, value="All"),
             "",
-            ""
+            "",
+            db.current_user,
+            categories
         )
     return (
         gr.update(visible=True),
@@ -636,7 +1129,9 @@ def login(username: str, password: str):
         gr.update(visible=False),
         gr.update(),
         username,
-        password
+        password,
+        None,
+        gr.update()
     )
 
 def register(username: str, password: str, email: str):
@@ -654,36 +1149,34 @@ def logout():
         gr.update(visible=False),
         "",
         gr.update(visible=False),
-        gr.update(choices=["All"])
+        gr.update(choices=["All"]),
+        None,
+        ["All"]
     )
 
 # ============================================================================
 # NOTES FUNCTIONS
 # ============================================================================
 
-def upload_note(title: str, category: str, subject: str, description: str, tags: str, file):
+def upload_note(user: Optional[Dict], title: str, category: str, subject: str,
+                description: str, tags: str, file, shown_categories: Optional[List[str]]):
     """Handle note upload"""
-    success, message = db.add_note(title, category, subject, description, tags, file)
+    db.current_user = user
+    success, message, categories = db.add_note_returning_categories(
+        title, category, subject, description, tags, file)
     if success:
-        # Refresh categories
-        categories = db.get_all_categories()
+        _invalidate_views()
         return (
             message,
             "", "", "", "", "", None,
-            gr.update(choices=categories)
+            # Re-send the choices only when they differ from what this session's dropdown has
+            gr.update(choices=categories) if categories != shown_categories else gr.update(),
+            categories
         )
-    return (
-        message,
-        title, category, subject, description, tags, file,
-        gr.update()
-    )
+    # Leave the form as the user filled it; gr.update() sends nothing for those fields
+    return (message,) + tuple(gr.update() for _ in range(8))
 
-def search_and_display(query: str, category: str, sort_by: str):
-    """Search and display notes"""
-    results = db.search_notes(query, category, sort_by)
-
-    if not results:
-        return """
+_EMPTY_HTML = """
         <div style="text-align:center;padding:80px 40px;">
             <div style="font-size:64px;margin-bottom:20px;">📭</div>
             <h3 style="color:#4a5568;margin:0 0 12px 0;">No notes found</h3>
@@ -691,58 +1184,149 @@ def search_and_display(query: str, category: str, sort_by: str):
         </div>
         """
 
-    html = f"""
+_HEADER_TEMPLATE = """
     <div style="background:linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                color:white;padding:24px 32px;border-radius:16px;margin-bottom:24px;">
         <h2 style="margin:0 0 8px 0;font-size:28px;font-weight:700;">
-            📚 Found {len(results)} Note{'' if len(results) == 1 else 's'}
+            📚 Showing {n} Note{s}
         </h2>
         <p style="margin:0;opacity:0.9;font-size:15px;">
             Browse and download study materials shared by your peers
         </p>
     </div>
-    """
-
-    for note in results:
-        html += format_note_card(note)
-
-    return html
-
-def download_note_by_id(note_id: str):
+    """.format
+
+# Seconds a rendered page may be reused, so changes made by other processes
+# sharing the database file show up without a local write
+SEARCH_CACHE_TTL = 30
+
+def _search_page(query: str, category: str, sort_by: str, page_size: int,
+                 before: Optional[Tuple]) -> Tuple[str, int, Optional[Tuple], bool]:
+    """Render the cards of the results page after the cursor `before`, with
+    their count, the cursor past them and whether more follow"""
+    # Read the version before querying: a page rendered while a write lands is
+    # filed under the old version, which nothing asks for once it is bumped
+    return _render_page(_data_version, int(time.monotonic() // SEARCH_CACHE_TTL),
+                        query, category, sort_by, page_size, before)
+
+@lru_cache(maxsize=64)
+def _render_page(version: int, window: int, query: str, category: str, sort_by: str,
+                 page_size: int, before: Optional[Tuple]) -> Tuple[str, int, Optional[Tuple], bool]:
+    """Cached body of _search_page, keyed on the data version and TTL window too"""
+    results, cursor, more = db.search_page(query, category, sort_by,
+                                           limit=page_size, before=before)
+    # One join over all cards, so the page is assembled in a single allocation
+    return "".join(map(format_note_card, results)), len(results), cursor, more
+
+def _results_html(shown: int, cards: str) -> str:
+    """Put the results header above the cards shown so far"""
+    if not shown:
+        return _EMPTY_HTML
+    return _HEADER_TEMPLATE(n=shown, s="" if shown == 1 else "s") + cards
+
+def search_and_display(query: str, category: str, sort_by: str, page_size: int = 20):
+    """Search and display the first page of notes"""
+    page_size = int(page_size)
+    # App load and every tab switch ask for the same page, so serve repeats from the cache
+    cards, shown, cursor, more = _search_page(query, category, sort_by, page_size, None)
+    # The search itself is kept, so "Load more" continues it even if the inputs were edited
+    state = (query, category, sort_by, page_size, cursor, shown, cards)
+    return _results_html(shown, cards), state, gr.update(visible=more)
+
+# Cards per streamed update of a fresh search
+_STREAM_BATCH = 10
+
+def search_and_stream(query: str, category: str, sort_by: str, page_size: int = 20):
+    """Search notes, sending the first page to the browser in batches as it renders"""
+    page_size = int(page_size)
+    results, cursor, more = db.search_page(query, category, sort_by, limit=page_size)
+
+    shown = len(results)
+    header = _HEADER_TEMPLATE(n=shown, s="" if shown == 1 else "s") if shown else ""
+    parts = []
+    # The header and first batch paint while the rest are still being formatted
+    for start in range(_STREAM_BATCH, shown, _STREAM_BATCH):
+        parts.extend(map(format_note_card, results[start - _STREAM_BATCH:start]))
+        yield header + "".join(parts), gr.update(), gr.update()
+    parts.extend(map(format_note_card, results[len(parts):]))
+
+    cards = "".join(parts)
+    state = (query, category, sort_by, page_size, cursor, shown, cards)
+    yield _results_html(shown, cards), state, gr.update(visible=more)
+
+def load_more_results(state: Optional[Tuple]):
+    """Append the next page of the current search"""
+    if not state:
+        return gr.update(), state, gr.update(visible=False)
+    # Resume after the last note shown rather than at an offset, so notes added
+    # or deleted since the previous page don't cause repeats or gaps
+    query, category, sort_by, page_size, cursor, shown, cards = state
+    page_cards, n, next_cursor, more = _search_page(query, category, sort_by, page_size, cursor)
+    shown, cards = shown + n, cards + page_cards
+    state = (query, category, sort_by, page_size, next_cursor or cursor, shown, cards)
+    return _results_html(shown, cards), state, gr.update(visible=more)
+
+# Bumped on every change to notes; each session remembers the version its tabs last drew
+_versions = count(1)
+_data_version = 0
+
+def _invalidate_views():
+    """Drop cached result pages and mark every session's tabs out of date"""
+    global _data_version
+    # Bump first, so a page stored after the clear is already unreachable
+    _data_version = next(_versions)
+    _render_page.cache_clear()
+
+def browse_on_tab(seen: Optional[int], page_size: int):
+    """Reload the browse list on tab switch, unless nothing changed since it was drawn"""
+    version = _data_version
+    if seen == version:
+        return gr.update(), gr.update(), gr.update(), seen
+    return *search_and_display("", "All", "recent", page_size), version
+
+_INVALID_ID = "❌ Invalid note ID. Please enter a number."
+
+def _parse_id(note_id: str) -> Optional[int]:
+    """Parse a note ID typed by the user, or None if it isn't a number"""
+    # isdecimal() accepts exactly what int() does here, without raising on bad input
+    note_id = note_id.strip()
+    return int(note_id) if note_id.isdecimal() else None
+
+def download_note_by_id(user: Optional[Dict], note_id: str):
     """Handle note download"""
-    try:
-        note_id_int = int(note_id)
-        success, message, file_path = db.download_note(note_id_int)
-        if success:
-            return message, file_path
-        return f"❌ {message}", None
-    except ValueError:
-        return "❌ Invalid note ID. Please enter a number.", None
+    db.current_user = user
+    note_id_int = _parse_id(note_id)
+    if note_id_int is None:
+        return _INVALID_ID, None
+    success, message, file_path = db.download_note(note_id_int)
+    if success:
+        # The card shows the download count
+        _invalidate_views()
+        return message, file_path
+    return f"❌ {message}", None
 
-def rate_note_by_id(note_id: str, rating: int, review: str):
+def rate_note_by_id(user: Optional[Dict], note_id: str, rating: int, review: str):
     """Handle note rating"""
-    try:
-        note_id_int = int(note_id)
-        success, message = db.rate_note(note_id_int, rating, review)
-        if success:
-            return f"{message}", "", 3, ""
-        return f"❌ {message}", note_id, rating, review
-    except ValueError:
-        return "❌ Invalid note ID. Please enter a number.", note_id, rating, review
-
-def show_user_profile():
-    """Display user profile"""
-    stats = db.get_user_stats()
-    if not stats:
-        return "<p style='text-align:center;color:#a0aec0;padding:40px;'>Please login to view profile</p>"
+    db.current_user = user
+    note_id_int = _parse_id(note_id)
+    if note_id_int is None:
+        return _INVALID_ID, gr.update(), gr.update(), gr.update()
+    success, message = db.rate_note(note_id_int, rating, review)
+    if success:
+        _invalidate_views()
+        return message, "", 3, ""
+    return f"❌ {message}", gr.update(), gr.update(), gr.update()
+
+_ROLE_BADGES = {
+    'student': ('🎓', '#667eea'),
+    'teacher': ('👨‍🏫', '#48bb78'),
+    'admin': ('⚡', '#f56565')
+}
+_DEFAULT_BADGE = ('👤', '#667eea')
 
-    role_badge = {
-        'student': ('🎓', '#667eea'),
-        'teacher': ('👨‍🏫', '#48bb78'),
-        'admin': ('⚡', '#f56565')
-    }.get(stats['role'], ('👤', '#667eea'))
+_PROFILE_LOGIN_HTML = "<p style='text-align:center;color:#a0aec0;padding:40px;'>Please login to view profile</p>"
 
-    profile_html = f"""
+_PROFILE_TMPL = """
     <div style="background:linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                 border-radius:20px;padding:40px;color:white;margin-bottom:32px;
                 box-shadow:0 20px 40px rgba(102,126,234,0.3);">
@@ -750,17 +1334,17 @@ def show_user_profile():
             <div style="background:white;width:100px;height:100px;border-radius:50%;
                        display:flex;align-items:center;justify-content:center;
                        font-size:48px;box-shadow:0 10px 20px rgba(0,0,0,0.2);">
-                {role_badge[0]}
+                {icon}
             </div>
             <div style="flex:1;">
                 <h2 style="margin:0 0 8px 0;font-size:32px;font-weight:700;">
-                    {stats['username']}
+                    {username}
                 </h2>
                 <p style="margin:0 0 4px 0;font-size:16px;opacity:0.95;">
-                    📧 {stats['email']}
+                    📧 {email}
                 </p>
                 <p style="margin:0;font-size:14px;opacity:0.85;">
-                    📅 Member since {stats['member_since']}
+                    📅 Member since {member_since}
                 </p>
             </div>
         </div>
@@ -768,28 +1352,107 @@ def show_user_profile():
 
     <div style="display:grid;grid-template-columns:repeat(auto-fit,minmax(240px,1fr));
                gap:20px;margin-top:32px;">
-        {create_stats_card("Notes Uploaded", str(stats['total_uploads']), "📤", "#667eea")}
-        {create_stats_card("Downloads Received", str(stats['total_downloads_of_uploads']), "⬇️", "#48bb78")}
-        {create_stats_card("Notes Downloaded", str(stats['personal_downloads']), "📥", "#f56565")}
+        {uploads_card}
+        {received_card}
+        {downloaded_card}
     </div>
     """
-    return profile_html
 
-def delete_note_by_id(note_id: str):
+def show_user_profile(user: Optional[Dict]):
+    """Display user profile"""
+    db.current_user = user
+    stats = db.get_user_stats()
+    if not stats:
+        return _PROFILE_LOGIN_HTML
+
+    username, email, member_since, uploads, downloads_received, downloaded, role = (
+        stats[k] for k in ('username', 'email', 'member_since', 'total_uploads',
+                           'total_downloads_of_uploads', 'personal_downloads', 'role'))
+    role_badge = _ROLE_BADGES.get(role, _DEFAULT_BADGE)
+
+    return _PROFILE_TMPL.format(
+        icon=role_badge[0],
+        username=escape(username),
+        email=escape(email),
+        member_since=member_since,
+        uploads_card=create_stats_card("Notes Uploaded", str(uploads), "📤", "#667eea"),
+        received_card=create_stats_card("Downloads Received", str(downloads_received), "⬇️", "#48bb78"),
+        downloaded_card=create_stats_card("Notes Downloaded", str(downloaded), "📥", "#f56565")
+    )
+
+def profile_on_tab(user: Optional[Dict], seen: Optional[Tuple]):
+    """Reload the profile on tab switch, unless neither the user nor the data changed"""
+    key = (user['id'] if user else None, _data_version)
+    if seen == key:
+        return gr.update(), seen
+    return show_user_profile(user), key
+
+def delete_note_by_id(user: Optional[Dict], note_id: str):
     """Handle note deletion"""
-    try:
-        note_id_int = int(note_id)
-        success, message = db.delete_note(note_id_int)
-        if success:
-            return f"{message}", ""
-        return f"❌ {message}", note_id
-    except ValueError:
-        return "❌ Invalid note ID. Please enter a number.", note_id
+    db.current_user = user
+    note_id_int = _parse_id(note_id)
+    if note_id_int is None:
+        return _INVALID_ID, gr.update()
+    success, message = db.delete_note(note_id_int)
+    if success:
+        _invalidate_views()
+        return message, ""
+    return f"❌ {message}", gr.update()
 
 # ============================================================================
 # GRADIO INTERFACE
 # ============================================================================
 
+# Static page blocks, built once and handed to gr.HTML
+_MAIN_HEADER_HTML = """
+    <div class="main-header">
+        <h1 style="margin:0;font-size:56px;font-weight:800;letter-spacing:-1px;">
+            ☁️ CloudNotes Pro
+        </h1>
+        <p style="margin:16px 0 0 0;font-size:20px;opacity:0.95;font-weight:400;">
+            Advanced Cloud-Powered Academic Notes Sharing Platform
+        </p>
+        <div style="margin-top:24px;display:flex;gap:24px;justify-content:center;
+                   font-size:14px;opacity:0.9;">
+            <span>🔐 Secure Authentication</span>
+            <span>💾 Real File Storage</span>
+            <span>🔍 Advanced Search</span>
+            <span>⭐ Rating System</span>
+        </div>
+    </div>
+    """
+
+_WELCOME_HTML = """
+    <div style="text-align:center;padding:40px 20px;">
+        <div style="font-size:80px;margin-bottom:20px;">📚</div>
+        <h2 style="color:#667eea;margin:0 0 12px 0;">Welcome to CloudNotes</h2>
+        <p style="color:#718096;margin:0;">Share knowledge, build community</p>
+    </div>
+    """
+
+_DOWNLOAD_HELP_HTML = """
+    <div style="background:#eef2ff;border-left:4px solid #667eea;
+               padding:20px;border-radius:12px;margin:20px 0;">
+        <strong style="color:#667eea;">💡 How to Download:</strong>
+        <ol style="margin:12px 0 0 0;color:#4a5568;">
+            <li>Browse notes in the "Browse Notes" tab</li>
+            <li>Copy the Note ID from the note card</li>
+            <li>Paste it below and click Download</li>
+        </ol>
+    </div>
+    """
+
+_RATE_HELP_HTML = """
+    <div style="background:#fff7ed;border-left:4px solid #f59e0b;
+               padding:20px;border-radius:12px;margin:20px 0;">
+        <strong style="color:#f59e0b;">⭐ Help the Community:</strong>
+        <p style="margin:8px 0 0 0;color:#4a5568;">
+            Your ratings help other students find quality study materials.
+            Rate notes you've downloaded and leave helpful reviews!
+        </p>
+    </div>
+    """
+
 custom_css = """
 .gradio-container {
     max-width: 1400px !important;
@@ -852,37 +1515,29 @@ button:hover {
 }
 """
 
-with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
+# Minified once at import; Gradio inlines this into every page it serves
+_MIN_CSS = re.sub(r'/\*.*?\*/', '', custom_css, flags=re.S)
+_MIN_CSS = re.sub(r'\s*([{};,])\s*', r'\1', re.sub(r'\s+', ' ', _MIN_CSS)).strip()
+
+with gr.Blocks(theme=gr.themes.Soft(), css=_MIN_CSS) as app:
+
+    # Logged-in user of this browser session
+    session_user = gr.State(None)
+    # Data version each tab last rendered for this session
+    browse_seen = gr.State(None)
+    # Current search and the pages of it shown so far
+    browse_pages = gr.State(None)
+    profile_seen = gr.State(None)
+    # Category choices last sent to this session's dropdown
+    category_choices = gr.State(["All"])
 
     # Header
-    gr.HTML("""
-        <div class="main-header">
-            <h1 style="margin:0;font-size:56px;font-weight:800;letter-spacing:-1px;">
-                ☁️ CloudNotes Pro
-            </h1>
-            <p style="margin:16px 0 0 0;font-size:20px;opacity:0.95;font-weight:400;">
-                Advanced Cloud-Powered Academic Notes Sharing Platform
-            </p>
-            <div style="margin-top:24px;display:flex;gap:24px;justify-content:center;
-                       font-size:14px;opacity:0.9;">
-                <span>🔐 Secure Authentication</span>
-                <span>💾 Real File Storage</span>
-                <span>🔍 Advanced Search</span>
-                <span>⭐ Rating System</span>
-            </div>
-        </div>
-    """)
+    gr.HTML(_MAIN_HEADER_HTML)
 
     # Login/Register Section
     with gr.Row(visible=True) as login_section:
         with gr.Column(scale=1):
-            gr.HTML("""
-                <div style="text-align:center;padding:40px 20px;">
-                    <div style="font-size:80px;margin-bottom:20px;">📚</div>
-                    <h2 style="color:#667eea;margin:0 0 12px 0;">Welcome to CloudNotes</h2>
-                    <p style="color:#718096;margin:0;">Share knowledge, build community</p>
-                </div>
-            """)
+            gr.HTML(_WELCOME_HTML)
 
         with gr.Column(scale=1):
             with gr.Tabs():
@@ -939,7 +1594,7 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
 
         with gr.Tabs() as tabs:
             # Browse & Search Tab
-            with gr.Tab("🔍 Browse Notes"):
+            with gr.Tab("🔍 Browse Notes") as browse_tab:
                 gr.Markdown("### 📚 Discover and download study materials")
 
                 with gr.Row():
@@ -957,6 +1612,7 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
                     sort_by = gr.Dropdown(
                         choices=[
                             ("Most Recent", "recent"),
+                            ("Best Match", "relevance"),
                             ("Most Popular", "popular"),
                             ("Highest Rated", "rating")
                         ],
@@ -964,15 +1620,23 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
                         label="Sort By",
                         scale=1
                     )
+                    page_size = gr.Dropdown(
+                        choices=[10, 20, 50, 100],
+                        value=20,
+                        label="Per Page",
+                        scale=1
+                    )
 
                 search_btn = gr.Button("🔍 Search Notes", variant="primary", size="lg")
 
                 search_results = gr.HTML()
+                load_more_btn = gr.Button("⬇️ Load More", variant="secondary", visible=False)
 
-                # Auto-load all notes on tab open
-                tabs.select(
-                    fn=lambda: search_and_display("", "All", "recent"),
-                    outputs=[search_results]
+                # Auto-load all notes when this tab is opened; app.load covers the first paint
+                browse_tab.select(
+                    fn=browse_on_tab,
+                    inputs=[browse_seen, page_size],
+                    outputs=[search_results, browse_pages, load_more_btn, browse_seen]
                 )
 
             # Upload Tab
@@ -1021,17 +1685,7 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
             with gr.Tab("⬇️ Download Notes"):
                 gr.Markdown("### 💾 Download notes directly to your device")
 
-                gr.HTML("""
-                    <div style="background:#eef2ff;border-left:4px solid #667eea;
-                               padding:20px;border-radius:12px;margin:20px 0;">
-                        <strong style="color:#667eea;">💡 How to Download:</strong>
-                        <ol style="margin:12px 0 0 0;color:#4a5568;">
-                            <li>Browse notes in the "Browse Notes" tab</li>
-                            <li>Copy the Note ID from the note card</li>
-                            <li>Paste it below and click Download</li>
-                        </ol>
-                    </div>
-                """)
+                gr.HTML(_DOWNLOAD_HELP_HTML)
 
                 with gr.Row():
                     download_id = gr.Textbox(
@@ -1048,16 +1702,7 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
             with gr.Tab("⭐ Rate Notes"):
                 gr.Markdown("### 📊 Share your feedback and rate notes")
 
-                gr.HTML("""
-                    <div style="background:#fff7ed;border-left:4px solid #f59e0b;
-                               padding:20px;border-radius:12px;margin:20px 0;">
-                        <strong style="color:#f59e0b;">⭐ Help the Community:</strong>
-                        <p style="margin:8px 0 0 0;color:#4a5568;">
-                            Your ratings help other students find quality study materials.
-                            Rate notes you've downloaded and leave helpful reviews!
-                        </p>
-                    </div>
-                """)
+                gr.HTML(_RATE_HELP_HTML)
 
                 with gr.Row():
                     with gr.Column(scale=2):
@@ -1082,7 +1727,7 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
                         rate_status = gr.Markdown()
 
             # My Profile Tab
-            with gr.Tab("👤 My Profile"):
+            with gr.Tab("👤 My Profile") as profile_tab:
                 gr.Markdown("### 📊 Your Statistics and Activity")
 
                 profile_display = gr.HTML()
@@ -1104,9 +1749,10 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
                 delete_status = gr.Markdown()
 
                 # Auto-load profile
-                tabs.select(
-                    fn=show_user_profile,
-                    outputs=[profile_display]
+                profile_tab.select(
+                    fn=profile_on_tab,
+                    inputs=[session_user, profile_seen],
+                    outputs=[profile_display, profile_seen]
                 )
 
     # ========================================================================
@@ -1118,7 +1764,8 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
         login,
         inputs=[login_username, login_password],
         outputs=[login_section, main_app, login_status, logout_btn,
-                search_category, login_username, login_password]
+                search_category, login_username, login_password, session_user,
+                category_choices]
     )
 
     reg_btn.click(
@@ -1129,64 +1776,73 @@ with gr.Blocks(theme=gr.themes.Soft(), css=custom_css) as app:
 
     logout_btn.click(
         logout,
-        outputs=[login_section, main_app, login_status, logout_btn, search_category]
+        outputs=[login_section, main_app, login_status, logout_btn, search_category,
+                session_user, category_choices]
     )
 
     # Search
     search_btn.click(
-        search_and_display,
-        inputs=[search_query, search_category, sort_by],
-        outputs=[search_results]
+        search_and_stream,
+        inputs=[search_query, search_category, sort_by, page_size],
+        outputs=[search_results, browse_pages, load_more_btn]
     )
 
     # Also trigger search on Enter key
     search_query.submit(
-        search_and_display,
-        inputs=[search_query, search_category, sort_by],
-        outputs=[search_results]
+        search_and_stream,
+        inputs=[search_query, search_category, sort_by, page_size],
+        outputs=[search_results, browse_pages, load_more_btn]
+    )
+
+    load_more_btn.click(
+        load_more_results,
+        inputs=[browse_pages],
+        outputs=[search_results, browse_pages, load_more_btn]
     )
 
     # Upload
     upload_btn.click(
         upload_note,
-        inputs=[upload_title, upload_category, upload_subject,
-               upload_desc, upload_tags, upload_file],
+        inputs=[session_user, upload_title, upload_category, upload_subject,
+               upload_desc, upload_tags, upload_file, category_choices],
         outputs=[upload_status, upload_title, upload_category,
                 upload_subject, upload_desc, upload_tags, upload_file,
-                search_category]
+                search_category, category_choices]
     )
 
     # Download
     download_btn.click(
         download_note_by_id,
-        inputs=[download_id],
+        inputs=[session_user, download_id],
         outputs=[download_status, download_file]
     )
 
     # Rate
     rate_btn.click(
         rate_note_by_id,
-        inputs=[rate_note_id, rating_slider, review_text],
+        inputs=[session_user, rate_note_id, rating_slider, review_text],
         outputs=[rate_status, rate_note_id, rating_slider, review_text]
     )
 
     # Profile
     refresh_profile_btn.click(
         show_user_profile,
+        inputs=[session_user],
         outputs=[profile_display]
     )
 
     # Delete
     delete_btn.click(
         delete_note_by_id,
-        inputs=[delete_note_id],
+        inputs=[session_user, delete_note_id],
         outputs=[delete_status, delete_note_id]
     )
 
     # Initial load
     app.load(
-        fn=lambda: search_and_display("", "All", "recent"),
-        outputs=[search_results]
+        fn=browse_on_tab,
+        inputs=[browse_seen, page_size],
+        outputs=[search_results, browse_pages, load_more_btn, browse_seen]
     )
 
 # Launch the application